@@ -3,10 +3,16 @@ FHIR Healthcare Data Transformation Demo
 Simulates Bronze to Silver layer processing with PII masking
 """
 
-import json
-import pandas as pd
+import orjson
+import pyarrow as pa
+import pyarrow.compute as pc
 from datetime import datetime
 import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from arrow_masking import mask_last4
+
 
 print("🏥 FHIR Healthcare Data Lakehouse - Transformation Demo")
 print("=" * 60)
@@ -64,32 +70,48 @@ print("  ✓ Truncating ZIP (10001 → 100)")
 print("  ✓ Adding audit timestamp")
 print("  ✓ Validating data quality")
 
-silver_data = []
-for record in bronze_data:
-    if record["resourceType"] == "Patient":
-        # HIPAA Masking
-        masked_record = {
-            "resourceType": record["resourceType"],
-            "patient_id": record["id"],
-            "name_masked": f"{record['name'][0]['given'][0][0]}. {record['name'][0]['family']}",
-            "birthDate": record["birthDate"],
-            "age_group": "Adult" if int(record["birthDate"][:4]) > 1960 else "Senior",
-            "gender": record["gender"],
-            "zip_region": record["address"][0]["postalCode"][:3] if "address" in record else "UNK",
-            "mrn_masked": f"***{record['identifier'][0]['value'][-4:]}",
-            "ssn_masked": f"***-**-{record['ssn'][-4:]}" if "ssn" in record else None,
-            "ingestion_timestamp": datetime.now().isoformat(),
-            "data_source": "FHIR-R4-API",
-            "compliance_flag": "HIPAA-MASKED"
-        }
-        silver_data.append(masked_record)
-        print(f"\n  Patient {record['id']}:")
-        print(f"    Before: {record['name'][0]['given'][0]} {record['name'][0]['family']} | {record['ssn']}")
-        print(f"    After:  {masked_record['name_masked']} | {masked_record['ssn_masked']}")
+# Vectorized masking: Arrow compute kernels over whole columns
+ingestion_timestamp = datetime.now().isoformat()
+bronze = pa.Table.from_batches([pa.RecordBatch.from_struct_array(pa.array(bronze_data))])
+patients = bronze.filter(pc.equal(bronze["resourceType"], "Patient"))
+n_patients = patients.num_rows
+
+name = pc.list_element(patients["name"], 0)
+given = pc.list_element(pc.struct_field(name, "given"), 0)
+family = pc.struct_field(name, "family")
+# Parsed once, stored as date32
+birth_date = pc.cast(pc.strptime(patients["birthDate"], format="%Y-%m-%d", unit="s"), pa.date32())
+birth_year = pc.year(birth_date)
+postal_code = pc.struct_field(pc.list_element(patients["address"], 0), "postalCode")
+mrn = pc.struct_field(pc.list_element(patients["identifier"], 0), "value")
+
+silver = pa.table({
+    "resourceType": patients["resourceType"],
+    "patient_id": patients["id"],
+    "name_masked": pc.binary_join_element_wise(pc.utf8_slice_codeunits(given, 0, 1), family, ". "),
+    "birthDate": birth_date,
+    "age_group": pc.if_else(pc.greater(birth_year, 1960), "Adult", "Senior"),
+    "gender": patients["gender"],
+    "zip_region": pc.fill_null(pc.utf8_slice_codeunits(postal_code, 0, 3), "UNK"),
+    "mrn_masked": mask_last4(mrn, "***"),
+    "ssn_masked": mask_last4(patients["ssn"], "***-**-"),
+    "ingestion_timestamp": pa.repeat(ingestion_timestamp, n_patients),
+    "data_source": pa.repeat("FHIR-R4-API", n_patients),
+    "compliance_flag": pa.repeat("HIPAA-MASKED", n_patients)
+})
+silver_data = silver.to_pylist()
+
+for patient_id, first, last, ssn, name_masked, ssn_masked in zip(
+        patients["id"].to_pylist(), given.to_pylist(), family.to_pylist(),
+        patients["ssn"].to_pylist(), silver["name_masked"].to_pylist(),
+        silver["ssn_masked"].to_pylist()):
+    print(f"\n  Patient {patient_id}:")
+    print(f"    Before: {first} {last} | {ssn}")
+    print(f"    After:  {name_masked} | {ssn_masked}")
 
 # Save Silver layer
-with open('output/silver_layer_patients.json', 'w') as f:
-    json.dump(silver_data, f, indent=2)
+with open('output/silver_layer_patients.json', 'wb') as f:
+    f.write(orjson.dumps(silver_data, option=orjson.OPT_INDENT_2))
 
 print(f"\n✅ Silver layer saved to output/silver_layer_patients.json")
 print(f"   Total records: {len(silver_data)}")
@@ -100,10 +122,15 @@ print(f"   PII Masked: Yes")
 print("\n📊 Step 3: Data Quality Validation")
 print("-" * 60)
 print("Quality Checks:")
-print(f"  ✓ Valid Patient IDs: {len([r for r in silver_data if r['patient_id']])}/{len(silver_data)}")
-print(f"  ✓ Masked SSNs: {len([r for r in silver_data if r['ssn_masked']])}/{len(silver_data)}")
-print(f"  ✓ Audit Timestamps: {len([r for r in silver_data if r['ingestion_timestamp']])}/{len(silver_data)}")
-print(f"  ✓ Compliance Flags: {len([r for r in silver_data if r['compliance_flag']])}/{len(silver_data)}")
+quality_cols = ["patient_id", "ssn_masked", "ingestion_timestamp", "compliance_flag"]
+counts = {
+    column: pc.sum(pc.not_equal(silver[column], ""), min_count=0).as_py()
+    for column in quality_cols
+}
+print(f"  ✓ Valid Patient IDs: {counts['patient_id']}/{n_patients}")
+print(f"  ✓ Masked SSNs: {counts['ssn_masked']}/{n_patients}")
+print(f"  ✓ Audit Timestamps: {counts['ingestion_timestamp']}/{n_patients}")
+print(f"  ✓ Compliance Flags: {counts['compliance_flag']}/{n_patients}")
 
 print("\n🎉 Transformation Complete!")
 print("=" * 60)
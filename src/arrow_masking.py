@@ -0,0 +1,48 @@
+"""
+Arrow Identifier Masking
+Numba kernel over Arrow string buffers for last-4 identifier masking
+HIPAA-compliant SSN/MRN masking for the Silver layer
+"""
+
+import numba
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+
+@numba.njit(parallel=True, cache=True)
+def _mask_last4_kernel(data, offsets, prefix, out_data, out_offsets):
+    """Write prefix + last (up to) 4 bytes of each variable-width string into out_data"""
+    n_prefix = prefix.shape[0]
+    for i in numba.prange(offsets.shape[0] - 1):
+        end = offsets[i + 1]
+        keep = min(4, end - offsets[i])
+        dst = out_offsets[i]
+        out_data[dst:dst + n_prefix] = prefix
+        out_data[dst + n_prefix:dst + n_prefix + keep] = data[end - keep:end]
+
+
+def mask_last4(values, prefix):
+    """
+    Mask identifiers to prefix + last 4 characters (nulls stay null)
+    Runs the Numba kernel straight over the Arrow offsets/data buffers, so
+    values of any length are handled; non-ASCII input uses Arrow kernels
+    """
+    values = pc.cast(values, pa.string())
+    if isinstance(values, pa.ChunkedArray):
+        values = values.combine_chunks()
+    if pc.any(pc.invert(pc.string_is_ascii(values))).as_py():
+        return pc.binary_join_element_wise(prefix, pc.utf8_slice_codeunits(values, -4), "")
+
+    _, offsets_buf, data_buf = values.buffers()
+    offsets = np.frombuffer(offsets_buf, dtype=np.int32)[values.offset:values.offset + len(values) + 1]
+    data = np.frombuffer(data_buf, dtype=np.uint8) if data_buf is not None else np.empty(0, dtype=np.uint8)
+    prefix_bytes = np.frombuffer(prefix.encode(), dtype=np.uint8)
+
+    out_offsets = np.zeros(len(values) + 1, dtype=np.int32)
+    np.cumsum(len(prefix_bytes) + np.minimum(4, np.diff(offsets)), out=out_offsets[1:])
+    out_data = np.empty(out_offsets[-1], dtype=np.uint8)
+    _mask_last4_kernel(data, offsets, prefix_bytes, out_data, out_offsets)
+
+    masked = pa.StringArray.from_buffers(len(values), pa.py_buffer(out_offsets), pa.py_buffer(out_data))
+    return pc.if_else(values.is_valid(), masked, pa.scalar(None, pa.string()))
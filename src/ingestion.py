@@ -4,22 +4,47 @@ Simulates ingestion of FHIR R4 patient resources into Azure Data Lake (Bronze la
 HIPAA-compliant with PII handling
 """
 
-import json
-import random
+import itertools
+import os
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
 from datetime import datetime, timedelta
-from typing import Dict, List
+from typing import Dict, Iterable, Iterator, List, Optional
 import logging
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Columnar Bronze layout: one column per FHIR field, nulls where a
+# field does not apply to the resource type
+BRONZE_SCHEMA = pa.schema([
+    ("resourceType", pa.string()),
+    ("id", pa.string()),
+    ("lastUpdated", pa.string()),
+    ("family", pa.string()),
+    ("given_first", pa.string()),
+    ("birthDate", pa.string()),
+    ("gender", pa.string()),
+    ("postalCode", pa.string()),
+    ("mrn", pa.string()),
+    ("practitioner", pa.string()),
+    ("narrative", pa.string()),
+    ("subject", pa.string()),
+    ("code", pa.string()),
+    ("value", pa.float64()),
+    ("unit", pa.string()),
+    ("effectiveDateTime", pa.string())
+])
+
 class FHIRDataGenerator:
     """
     Generates synthetic FHIR R4 Patient and Observation resources
     for healthcare data platform testing
     """
     
-    def __init__(self):
+    def __init__(self, seed: Optional[int] = None):
+        self.rng = np.random.default_rng(seed)
         self.conditions = [
             "Diabetes mellitus type 2", 
             "Hypertension", 
@@ -32,61 +57,99 @@ class FHIRDataGenerator:
             "Dr. James Johnson", 
             "Dr. Emily Brown"
         ]
+        self.first_names = np.array(["John", "Jane", "Robert", "Maria", "David", "Lisa"])
+        self.last_names = np.array(["Smith", "Johnson", "Williams", "Brown", "Jones"])
+        self.genders = np.array(["male", "female"])
+        self.obs_types = [
+            {"code": "8867-4", "display": "Heart rate", "unit": "beats/min", "min": 60, "max": 100},
+            {"code": "2708-6", "display": "Oxygen saturation", "unit": "%", "min": 95, "max": 100},
+            {"code": "8310-5", "display": "Body temperature", "unit": "Cel", "min": 36.5, "max": 37.5}
+        ]
+        self._obs_min = np.array([t["min"] for t in self.obs_types], dtype=float)
+        self._obs_max = np.array([t["max"] for t in self.obs_types], dtype=float)
         
-    def generate_patient(self, patient_id: str) -> Dict:
-        """Generate synthetic FHIR Patient resource"""
-        first_names = ["John", "Jane", "Robert", "Maria", "David", "Lisa"]
-        last_names = ["Smith", "Johnson", "Williams", "Brown", "Jones"]
+        # Every possible ZIP string, built on first batch use (see _zip_strings)
+        self._zip_pool = None
+    
+    def _zip_strings(self) -> np.ndarray:
+        """Fixed-width (U5) pool of all 5-digit ZIPs so batch draws don't format per patient"""
+        if self._zip_pool is None:
+            self._zip_pool = np.arange(10000, 100000).astype("U5")
+        return self._zip_pool
+    
+    def _draw_patients(self, n: int) -> Dict[str, List]:
+        """Draw attributes for n patients in one shot (one array per field)"""
+        # Birthdates for 18-85 year olds
+        days_old = self.rng.integers(18*365, 85*365, n, endpoint=True)
+        today = np.datetime64(datetime.now().date())
+        birthdates = (today - days_old.astype("timedelta64[D]")).astype(str)
         
-        # Generate birthdate (18-85 years old)
-        days_old = random.randint(18*365, 85*365)
-        birthdate = (datetime.now() - timedelta(days=days_old)).strftime("%Y-%m-%d")
+        return {
+            "given": self.rng.choice(self.first_names, n).tolist(),
+            "family": self.rng.choice(self.last_names, n).tolist(),
+            "gender": self.rng.choice(self.genders, n).tolist(),
+            "birthDate": birthdates.tolist(),
+            "postalCode": self.rng.choice(self._zip_strings(), n).tolist(),
+            "provider": self.rng.choice(self.providers, n).tolist()
+        }
+    
+    def _draw_observations(self, n: int) -> Dict[str, List]:
+        """Draw type, id suffix and value for n observations in one shot"""
+        obs_idx = self.rng.integers(0, len(self.obs_types), n)
+        values = self.rng.uniform(self._obs_min[obs_idx], self._obs_max[obs_idx])
         
-        patient = {
+        return {
+            "obs_idx": obs_idx.tolist(),
+            "suffix": self.rng.integers(1000, 9999, n, endpoint=True).tolist(),
+            "value": np.round(values, 1).tolist()
+        }
+    
+    def _patient_resource(self, patient_id: str, mrn: str, given: str, family: str, gender: str,
+                          birth_date: str, postal_code: str, provider: str, timestamp: str) -> Dict:
+        """Assemble a FHIR Patient resource from pre-drawn attributes"""
+        return {
             "resourceType": "Patient",
             "id": patient_id,
             "meta": {
                 "versionId": "1",
-                "lastUpdated": datetime.utcnow().isoformat()
+                "lastUpdated": timestamp
             },
             "identifier": [
                 {
                     "system": "http://hospital.smarthealth.com/mrn",
-                    "value": f"MRN{patient_id.zfill(6)}"
+                    "value": mrn
                 }
             ],
             "name": [{
                 "use": "official",
-                "family": random.choice(last_names),
-                "given": [random.choice(first_names)]
+                "family": family,
+                "given": [given]
             }],
-            "gender": random.choice(["male", "female"]),
-            "birthDate": birthdate,
+            "gender": gender,
+            "birthDate": birth_date,
             "address": [{
                 "use": "home",
                 "city": "New York",
                 "state": "NY",
-                "postalCode": f"{random.randint(10000, 99999)}"
+                "postalCode": postal_code
             }],
             "generalPractitioner": [{
-                "display": random.choice(self.providers)
-            }]
+                "display": provider
+            }],
+            "text": {
+                "status": "generated",
+                "div": f'<div xmlns="http://www.w3.org/1999/xhtml">{mrn}, home ZIP {postal_code}, PCP {provider}</div>'
+            }
         }
-        return patient
     
-    def generate_observation(self, patient_id: str) -> Dict:
-        """Generate synthetic FHIR Observation (vital signs)"""
-        obs_types = [
-            {"code": "8867-4", "display": "Heart rate", "unit": "beats/min", "min": 60, "max": 100},
-            {"code": "2708-6", "display": "Oxygen saturation", "unit": "%", "min": 95, "max": 100},
-            {"code": "8310-5", "display": "Body temperature", "unit": "Cel", "min": 36.5, "max": 37.5}
-        ]
-        
-        obs_type = random.choice(obs_types)
+    def _observation_resource(self, patient_id: str, obs_idx: int, suffix: int, value: float,
+                              timestamp: str) -> Dict:
+        """Assemble a FHIR Observation (vital signs) from pre-drawn attributes"""
+        obs_type = self.obs_types[obs_idx]
         
-        observation = {
+        return {
             "resourceType": "Observation",
-            "id": f"obs-{patient_id}-{random.randint(1000, 9999)}",
+            "id": f"obs-{patient_id}-{suffix}",
             "status": "final",
             "category": [{
                 "coding": [{
@@ -105,53 +168,140 @@ class FHIRDataGenerator:
             "subject": {
                 "reference": f"Patient/{patient_id}"
             },
-            "effectiveDateTime": datetime.utcnow().isoformat(),
+            "effectiveDateTime": timestamp,
             "valueQuantity": {
-                "value": round(random.uniform(obs_type["min"], obs_type["max"]), 1),
+                "value": value,
                 "unit": obs_type["unit"],
                 "system": "http://unitsofmeasure.org"
             }
         }
-        return observation
     
-    def generate_batch(self, batch_size: int = 100) -> List[Dict]:
-        """Generate a batch of FHIR resources"""
-        resources = []
+    def generate_patient(self, patient_id: str, timestamp: Optional[str] = None) -> Dict:
+        """Generate synthetic FHIR Patient resource"""
+        # Scalar path: a single record can't amortize the vectorized draws,
+        # so scale one small batch of uniforms into plain Python indices
+        sizes = (len(self.first_names), len(self.last_names), len(self.genders),
+                 len(self.providers), 90000, 67*365 + 1)
+        given, family, gender, provider, zip_offset, days_old = [
+            int(u * size) for u, size in zip(self.rng.random(len(sizes)).tolist(), sizes)
+        ]
+        birthdate = (datetime.now() - timedelta(days=18*365 + days_old)).strftime("%Y-%m-%d")
+        
+        return self._patient_resource(
+            patient_id, f"MRN{patient_id.zfill(6)}", str(self.first_names[given]),
+            str(self.last_names[family]), str(self.genders[gender]), birthdate,
+            str(10000 + zip_offset), self.providers[provider],
+            timestamp or datetime.utcnow().isoformat()
+        )
+    
+    def generate_observation(self, patient_id: str, timestamp: Optional[str] = None) -> Dict:
+        """Generate synthetic FHIR Observation (vital signs)"""
+        u_type, u_suffix, u_value = self.rng.random(3).tolist()
+        obs_idx = int(u_type * len(self.obs_types))
+        obs_type = self.obs_types[obs_idx]
+        suffix = int(u_suffix * 9000)
+        value = obs_type["min"] + (obs_type["max"] - obs_type["min"]) * u_value
+        
+        return self._observation_resource(
+            patient_id, obs_idx, 1000 + suffix, round(value, 1),
+            timestamp or datetime.utcnow().isoformat()
+        )
+    
+    def generate_batch(self, batch_size: int = 100, chunk_size: int = 10_000) -> Iterator[Dict]:
+        """
+        Generate a batch of FHIR resources
+        Random attributes are drawn in vectorized calls one chunk of
+        chunk_size patients at a time; resources sharing one batch timestamp
+        are yielded as they are built, so memory stays O(chunk_size)
+        """
+        timestamp = datetime.utcnow().isoformat()
         
-        for i in range(batch_size):
-            patient_id = str(1000 + i)
+        for chunk_start in range(0, batch_size, chunk_size):
+            n = min(chunk_size, batch_size - chunk_start)
+            p = self._draw_patients(n)
+            patient_ids = np.arange(1000 + chunk_start, 1000 + chunk_start + n).astype(str)
+            mrns = np.char.add("MRN", np.char.zfill(patient_ids, 6)).tolist()
+            patient_ids = patient_ids.tolist()
+            
+            # 1-3 observations per patient
+            obs_counts = self.rng.integers(1, 3, n, endpoint=True).tolist()
+            o = self._draw_observations(sum(obs_counts))
             
-            # Add patient
-            resources.append(self.generate_patient(patient_id))
+            obs_pos = 0
             
-            # Add 1-3 observations per patient
-            for _ in range(random.randint(1, 3)):
-                resources.append(self.generate_observation(patient_id))
+            for i in range(n):
+                patient_id = patient_ids[i]
                 
-        return resources
+                # Add patient
+                yield self._patient_resource(
+                    patient_id, mrns[i], p["given"][i], p["family"][i], p["gender"][i],
+                    p["birthDate"][i], p["postalCode"][i], p["provider"][i], timestamp
+                )
+                
+                # Add its observations
+                for j in range(obs_pos, obs_pos + obs_counts[i]):
+                    yield self._observation_resource(
+                        patient_id, o["obs_idx"][j], o["suffix"][j], o["value"][j], timestamp
+                    )
+                obs_pos += obs_counts[i]
     
-    def save_to_bronze(self, batch: List[Dict], filename: str = None):
+    @staticmethod
+    def _bronze_row(resource: Dict) -> Dict:
+        """Flatten one FHIR resource into a Bronze row"""
+        if resource["resourceType"] == "Patient":
+            name = resource["name"][0]
+            return {
+                "resourceType": "Patient",
+                "id": resource["id"],
+                "lastUpdated": resource["meta"]["lastUpdated"],
+                "family": name["family"],
+                "given_first": name["given"][0],
+                "birthDate": resource["birthDate"],
+                "gender": resource["gender"],
+                "postalCode": resource["address"][0]["postalCode"],
+                "mrn": resource["identifier"][0]["value"],
+                "practitioner": resource["generalPractitioner"][0]["display"],
+                "narrative": resource["text"]["div"]
+            }
+        
+        quantity = resource["valueQuantity"]
+        return {
+            "resourceType": resource["resourceType"],
+            "id": resource["id"],
+            "subject": resource["subject"]["reference"],
+            "code": resource["code"]["coding"][0]["code"],
+            "value": quantity["value"],
+            "unit": quantity["unit"],
+            "effectiveDateTime": resource["effectiveDateTime"]
+        }
+    
+    def save_to_bronze(self, batch: Iterable[Dict], filename: str = None,
+                       chunk_size: int = 10_000) -> int:
         """
-        Save FHIR bundle to Bronze layer (simulated)
+        Stream FHIR resources to Bronze layer as a columnar Parquet file
+        Resources are consumed chunk_size at a time, one row group per chunk
         In production, this writes to Azure Data Lake Gen2
         """
         if filename is None:
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"bronze/fhir_raw_{timestamp}.json"
+            filename = f"bronze/fhir_raw_{timestamp}.parquet"
         
-        bundle = {
-            "resourceType": "Bundle",
-            "type": "collection",
-            "timestamp": datetime.utcnow().isoformat(),
-            "entry": [{"resource": r} for r in batch]
-        }
+        # In real scenario: pass an ADLS Gen2 filesystem (abfss://) to ParquetWriter
+        if os.path.dirname(filename):
+            os.makedirs(os.path.dirname(filename), exist_ok=True)
         
-        # In real scenario: Write to ADLS Gen2
-        # with open(filename, 'w') as f:
-        #     json.dump(bundle, f, indent=2)
+        resources = iter(batch)
+        saved = 0
+        with pq.ParquetWriter(filename, BRONZE_SCHEMA, compression="zstd") as writer:
+            while True:
+                rows = [self._bronze_row(r) for r in itertools.islice(resources, chunk_size)]
+                if not rows:
+                    break
+                writer.write_table(pa.Table.from_pylist(rows, schema=BRONZE_SCHEMA))
+                saved += len(rows)
         
-        logger.info(f"Bronze: Saved {len(batch)} resources to {filename}")
-        return bundle
+        logger.info(f"Bronze: Saved {saved} resources to {filename}")
+        return saved
 
 if __name__ == "__main__":
     generator = FHIRDataGenerator()
@@ -161,6 +311,6 @@ if __name__ == "__main__":
     
     for batch_num in range(5):  # 5 batches
         batch = generator.generate_batch(batch_size=50)
-        generator.save_to_bronze(batch, filename=f"batch_{batch_num}.json")
+        generator.save_to_bronze(batch, filename=f"bronze/batch_{batch_num}.parquet")
         
     logger.info("Ingestion complete. Data ready for Silver layer processing.")
@@ -0,0 +1,75 @@
+"""
+PII Detection for Free-Text FHIR Fields
+Single-pass RE2 set scan for SSN, MRN and ZIP patterns
+HIPAA-compliant redaction shared by the Spark and demo pipelines
+"""
+
+from typing import List, Tuple
+import re2
+
+# PII patterns for free-text fields; list position is the RE2 set pattern ID
+PII_PATTERNS = [
+    ("SSN", r"\b\d{3}-\d{2}-\d{4,}\b"),   # standard; over-long tail masked, not leaked
+    ("SSN", r"\b\d{9,}\b"),               # compact; longer digit runs masked too
+    ("SSN", r"\bXXX-XX-\d{4,}\b"),        # already masked upstream
+    ("MRN", r"\bMRN\d{6,}"),              # whole digit run, so no digit leaks
+    ("ZIP", r"\b\d{5}\b"),
+]
+
+PII_MASKERS = {
+    "SSN": lambda value: f"***-**-{value[-4:]}",
+    "MRN": lambda value: f"***{value[-4:]}",
+    "ZIP": lambda value: f"{value[:3]}**",
+}
+
+
+def _compile_pii_set(patterns):
+    """Compile all PII patterns into one RE2 set (a single DFA scan per text)"""
+    pii_set = re2.Set.SearchSet(re2.Options())
+    for _, pattern in patterns:
+        pii_set.Add(pattern)
+    pii_set.Compile()
+    return pii_set
+
+
+_PII_SET = _compile_pii_set(PII_PATTERNS)
+_PII_REGEXES = [re2.compile(pattern) for _, pattern in PII_PATTERNS]
+
+
+def detect_pii(text: str) -> List[Tuple[int, Tuple[int, int]]]:
+    """
+    Detect PII in free text
+    Returns (pattern_id, span) pairs ordered by position. The RE2 set scans the
+    text once; spans are only located for patterns that actually matched.
+    """
+    if not text:
+        return []
+
+    matched_ids = _PII_SET.Match(text)
+    if not matched_ids:
+        return []
+
+    hits = []
+    for pattern_id in matched_ids:
+        for match in _PII_REGEXES[pattern_id].finditer(text):
+            hits.append((pattern_id, match.span()))
+    # Earliest first; on a shared start the longest span wins
+    return sorted(hits, key=lambda hit: (hit[1][0], -hit[1][1]))
+
+
+def redact_pii(text: str) -> str:
+    """Route every detected PII span to its masker (SSN -> ***-**-XXXX, MRN -> ***XXXX)"""
+    if not text:
+        return text
+
+    pieces = []
+    cursor = 0
+    for pattern_id, (start, end) in detect_pii(text):
+        if start < cursor:  # overlaps a span that is already masked
+            continue
+        kind = PII_PATTERNS[pattern_id][0]
+        pieces.append(text[cursor:start])
+        pieces.append(PII_MASKERS[kind](text[start:end]))
+        cursor = end
+    pieces.append(text[cursor:])
+    return "".join(pieces)
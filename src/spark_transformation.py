@@ -4,88 +4,152 @@ Validates, cleans, and masks PII from FHIR data
 HIPAA-compliant processing with Spark
 """
 
+from pyspark import StorageLevel
 from pyspark.sql import SparkSession
 from pyspark.sql.functions import *
 from pyspark.sql.types import *
+from typing import Iterable
+import pandas as pd
 import logging
 
+import pii_detection
+from pii_detection import redact_pii
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+
+@pandas_udf(StringType())
+def redact_pii_udf(texts: pd.Series) -> pd.Series:
+    """Arrow-batched PII redaction: one RE2 set scan per value, per partition"""
+    return texts.map(redact_pii, na_action="ignore")
+
+
+# Allowed FHIR administrative gender codes for Silver validation
+VALID_GENDERS = ["male", "female", "other", "unknown"]
+
+
 class HealthcareDataTransformer:
     """
     Transforms raw FHIR data from Bronze to Silver layer
     Applies HIPAA compliance rules and data quality checks
     """
     
-    def __init__(self):
+    def __init__(self, free_text_columns: Iterable[str] = ("narrative",)):
+        self.free_text_columns = list(free_text_columns)
+        self._bronze_cache = None
         self.spark = SparkSession.builder \
             .appName("FHIR-Healthcare-ETL") \
             .config("spark.sql.adaptive.enabled", "true") \
             .getOrCreate()
+        
+        # Executors import the redaction UDF's helpers by module name
+        self.spark.sparkContext.addPyFile(pii_detection.__file__)
             
         logger.info("Spark session initialized for healthcare ETL")
     
     def load_bronze_data(self, input_path: str = "bronze/"):
         """Load raw FHIR data from Bronze layer"""
-        # In production: Read from ADLS Gen2
-        # df = self.spark.read.json(f"abfss://{input_path}@storage.dfs.core.windows.net/")
+        # In production: Read columnar Bronze Parquet from ADLS Gen2. The
+        # resourceType filter and column projection are pushed into the scan.
+        # df = self.spark.read.parquet(f"abfss://{input_path}@storage.dfs.core.windows.net/") \
+        #     .filter(col("resourceType") == "Patient") \
+        #     .select(*[field.name for field in schema.fields])
         
-        # Simulated data for demonstration
+        # Bronze Patient columns (see BRONZE_SCHEMA in ingestion.py)
         schema = StructType([
             StructField("resourceType", StringType(), True),
             StructField("id", StringType(), True),
-            StructField("name", ArrayType(StructType([
-                StructField("family", StringType(), True),
-                StructField("given", ArrayType(StringType()), True)
-            ])), True),
+            StructField("family", StringType(), True),
+            StructField("given_first", StringType(), True),
             StructField("birthDate", StringType(), True),
             StructField("gender", StringType(), True),
-            StructField("address", ArrayType(StructType([
-                StructField("postalCode", StringType(), True)
-            ])), True),
-            StructField("identifier", ArrayType(StructType([
-                StructField("value", StringType(), True)
-            ])), True)
+            StructField("postalCode", StringType(), True),
+            StructField("mrn", StringType(), True),
+            StructField("narrative", StringType(), True)
         ])
         
-        # Create sample data
+        # Simulated data for demonstration
         data = [
-            ("Patient", "1001", [{"family": "Smith", "given": ["John"]}], "1985-05-15", "male", [{"postalCode": "10001"}], [{"value": "MRN001001"}]),
-            ("Patient", "1002", [{"family": "Doe", "given": ["Jane"]}], "1990-08-22", "female", [{"postalCode": "10002"}], [{"value": "MRN001002"}]),
+            ("Patient", "1001", "Smith", "John", "1985-05-15", "male", "10001", "MRN001001",
+             "<div>MRN001001, SSN 123-45-6789, home ZIP 10001</div>"),
+            ("Patient", "1002", "Doe", "Jane", "1990-08-22", "female", "10002", "MRN001002",
+             "<div>MRN001002, home ZIP 10002, PCP Dr. Emily Brown</div>"),
         ]
         
-        df = self.spark.createDataFrame(data, schema)
-        logger.info(f"Loaded {df.count()} records from Bronze layer")
-        return df
+        return self.spark.createDataFrame(data, schema)
+    
+    def _with_birth_date(self, df):
+        """Parse the Bronze birthDate string once into a DateType column"""
+        return df.withColumn("birthDate", to_date(col("birthDate"), "yyyy-MM-dd"))
+    
+    def _birth_year(self):
+        """Birth year of the DateType birthDate (an int32 day count, no string parse)"""
+        return year(col("birthDate"))
+    
+    def _validity_predicate(self):
+        """
+        Data quality rules as a single predicate
+        Non-null IDs, birth year between 1900 and now, allowed gender values
+        """
+        current_year = year(current_date())
+        return (
+            col("id").isNotNull()
+            & self._birth_year().between(1900, current_year)
+            & col("gender").isin(VALID_GENDERS)
+        )
+    
+    def _masked_pii_columns(self, df):
+        """Projection expressions that replace the raw PII columns"""
+        masked = [
+            # MRN - show only last 4 characters (fixed-width MRNnnnnnn)
+            substring(col("mrn"), -4, 4).alias("mrn_masked"),
+            
+            # Name - keep only first initial
+            concat(
+                substring(col("given_first"), 1, 1),
+                lit(". "),
+                col("family")
+            ).alias("name_initial"),
+            
+            # Zip Code - keep only first 3 digits
+            substring(col("postalCode"), 1, 3).alias("zip_region")
+        ]
+        
+        # Redact PII in free-text fields where its position is unknown
+        masked += [
+            redact_pii_udf(col(column)).alias(column)
+            for column in self.free_text_columns if column in df.columns
+        ]
+        return masked
+    
+    def _log_quality(self, df):
+        """Count valid and invalid records in one aggregation pass"""
+        counts = df.agg(
+            count(lit(1)).alias("total"),
+            count(when(self._validity_predicate(), 1)).alias("valid")
+        ).first()
+        final_count = counts["valid"]
+        dropped_count = counts["total"] - final_count
+        
+        logger.info(f"Validation complete: {final_count} valid, {dropped_count} dropped")
+        
+        if dropped_count > 0:
+            logger.warning(f"Data quality issue: {dropped_count} records failed validation")
     
     def mask_pii(self, df):
         """
         HIPAA-compliant PII masking
         Masks: MRN (last 4 digits), Full name (initials only), Zip (first 3 digits)
+        Redacts: SSN/MRN/ZIP found anywhere in the configured free-text columns
         """
         logger.info("Applying PII masking...")
         
-        # Mask MRN - show only last 4 characters
-        df = df.withColumn("mrn_masked", 
-            regexp_extract(col("identifier")[0]["value"], r".*(\d{4})$", 1))
-        
-        # Mask Name - keep only first initial
-        df = df.withColumn("name_initial",
-            concat(
-                substring(col("name")[0]["given"][0], 1, 1),
-                lit(". "),
-                col("name")[0]["family"]
-            ))
+        # Original PII columns are dropped by projecting around them
+        replaced = {"family", "given_first", "postalCode", "mrn", *self.free_text_columns}
+        kept = [column for column in df.columns if column not in replaced]
         
-        # Mask Zip Code - keep only first 3 digits
-        df = df.withColumn("zip_region",
-            substring(col("address")[0]["postalCode"], 1, 3))
-        
-        # Remove original PII columns
-        df = df.drop("name", "address", "identifier")
-        
-        return df
+        return df.select(*kept, *self._masked_pii_columns(df))
     
     def validate_data(self, df):
         """
@@ -94,59 +158,50 @@ class HealthcareDataTransformer:
         """
         logger.info("Running data quality validations...")
         
-        initial_count = df.count()
-        
-        # Check 1: Remove records with null IDs
-        df = df.filter(col("id").isNotNull())
-        
-        # Check 2: Valid birth dates (not in future, not too old)
-        current_year = year(current_date())
-        df = df.withColumn("birth_year", year(to_date(col("birthDate"), "yyyy-MM-dd")))
-        df = df.filter((col("birth_year") <= current_year) & (col("birth_year") >= 1900))
+        df = self._with_birth_date(df)
+        self._log_quality(df)
         
-        # Check 3: Valid gender values
-        valid_genders = ["male", "female", "other", "unknown"]
-        df = df.filter(col("gender").isin(valid_genders))
-        
-        final_count = df.count()
-        dropped_count = initial_count - final_count
-        
-        logger.info(f"Validation complete: {final_count} valid, {dropped_count} dropped")
-        
-        if dropped_count > 0:
-            logger.warning(f"Data quality issue: {dropped_count} records failed validation")
-        
-        return df
+        return df.where(self._validity_predicate()) \
+                 .withColumn("birth_year", self._birth_year())
     
     def transform_to_silver(self, df):
         """
         Main transformation logic
-        Applies masking, validation, and schema standardization
+        Applies masking, validation, and schema standardization as one
+        filter and one projection so the whole step runs as a single stage
         """
         logger.info("Transforming Bronze to Silver layer...")
         
-        # Step 1: PII Masking (HIPAA)
-        df = self.mask_pii(df)
-        
-        # Step 2: Data Quality
-        df = self.validate_data(df)
-        
-        # Step 3: Add metadata
-        df = df.withColumn("ingestion_timestamp", current_timestamp())
-        df = df.withColumn("data_source", lit("FHIR-R4-API"))
-        df = df.withColumn("compliance_flag", lit("HIPAA-MASKED"))
-        
-        # Step 4: Standardize column names
-        df = df.withColumnRenamed("id", "patient_id") \
-               .withColumnRenamed("resourceType", "resource_type")
+        # Silver stores birthDate as DateType; parse it once up front.
+        # The parsed Bronze rows are cached: the quality aggregate below
+        # fills the cache, and the Silver projection (and every action in
+        # save_to_silver) reads from it instead of rescanning Bronze.
+        df = self._with_birth_date(df).persist(StorageLevel.MEMORY_AND_DISK)
+        self._bronze_cache = df
+        
+        # Data Quality metrics (single aggregation over Bronze)
+        self._log_quality(df)
+        
+        # Validation, PII masking (HIPAA), metadata and standardized names.
+        # current_timestamp() is evaluated once per query, so every row of
+        # the batch shares the same ingestion_timestamp.
+        df = df.where(self._validity_predicate()).select(
+            col("resourceType").alias("resource_type"),
+            col("id").alias("patient_id"),
+            col("birthDate"),
+            col("gender"),
+            *self._masked_pii_columns(df),
+            self._birth_year().alias("birth_year"),
+            current_timestamp().alias("ingestion_timestamp"),
+            lit("FHIR-R4-API").alias("data_source"),
+            lit("HIPAA-MASKED").alias("compliance_flag")
+        )
         
         logger.info("Silver layer transformation complete")
         return df
     
     def save_to_silver(self, df, output_path: str = "silver/"):
         """Save processed data to Silver layer (Delta Lake format)"""
-        logger.info(f"Saving {df.count()} records to Silver layer...")
-        
         # In production: Write to ADLS Gen2 as Delta
         # df.write.format("delta").mode("append").save(f"abfss://{output_path}...")
         
@@ -156,6 +211,10 @@ class HealthcareDataTransformer:
         print("\nSample Data (PII Masked):")
         df.show(5, truncate=False)
         
+        # Release the parsed Bronze cache from transform_to_silver
+        if self._bronze_cache is not None:
+            self._bronze_cache.unpersist()
+            self._bronze_cache = None
         return df
 
 if __name__ == "__main__":
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# src/ modules are run as scripts, not an installed package
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
@@ -0,0 +1,57 @@
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from arrow_masking import mask_last4
+
+
+def _arrow_reference(values, prefix):
+    return pc.binary_join_element_wise(prefix, pc.utf8_slice_codeunits(values, -4), "")
+
+
+def test_fixed_width_ssn():
+    assert mask_last4(pa.array(["123-45-6789", "987-65-4321"]), "***-**-").to_pylist() == [
+        "***-**-6789", "***-**-4321"
+    ]
+
+
+def test_off_width_values_keep_their_real_last_four():
+    values = pa.array(["MRN0010010", "MRN1001", "MRN001001"])
+    assert mask_last4(values, "***").to_pylist() == ["***0010", "***1001", "***1001"]
+
+
+def test_short_and_empty_values():
+    assert mask_last4(pa.array(["12", ""]), "***").to_pylist() == ["***12", "***"]
+
+
+def test_nulls_stay_null():
+    assert mask_last4(pa.array(["MRN001001", None]), "***").to_pylist() == ["***1001", None]
+    assert mask_last4(pa.array([None, None], pa.string()), "***").to_pylist() == [None, None]
+
+
+def test_empty_array():
+    assert mask_last4(pa.array([], pa.string()), "***").to_pylist() == []
+
+
+def test_sliced_array_uses_its_offset():
+    values = pa.array(["MRN0010010", "MRN1001", "MRN001001", None, "x1234"]).slice(1, 3)
+    assert mask_last4(values, "***").to_pylist() == ["***1001", "***1001", None]
+
+
+def test_chunked_array():
+    values = pa.chunked_array([["123-45-6789", None], ["987-65-4321"]])
+    assert mask_last4(values, "***-**-").to_pylist() == ["***-**-6789", None, "***-**-4321"]
+
+
+def test_large_string_input():
+    values = pa.array(["MRN001001"], pa.large_string())
+    assert mask_last4(values, "***").to_pylist() == ["***1001"]
+
+
+def test_non_ascii_falls_back_to_character_slicing():
+    assert mask_last4(pa.array(["ñ12345", "MRNñ001"]), "***").to_pylist() == ["***2345", "***ñ001"]
+
+
+def test_matches_arrow_reference():
+    values = pa.array([None if i % 7 == 0 else "9" * (i % 13) for i in range(500)]).slice(3)
+    for prefix in ("***", "***-**-"):
+        assert mask_last4(values, prefix).equals(_arrow_reference(values, prefix))
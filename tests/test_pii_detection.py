@@ -0,0 +1,73 @@
+from pii_detection import PII_PATTERNS, detect_pii, redact_pii
+
+
+def _kinds(text):
+    return [PII_PATTERNS[pattern_id][0] for pattern_id, _ in detect_pii(text)]
+
+
+def test_standard_ssn():
+    assert redact_pii("SSN 123-45-6789 on file") == "SSN ***-**-6789 on file"
+
+
+def test_compact_ssn():
+    assert redact_pii("ssn:123456789") == "ssn:***-**-6789"
+
+
+def test_premasked_ssn_is_normalized():
+    assert redact_pii("ssn XXX-XX-1234") == "ssn ***-**-1234"
+
+
+def test_mrn():
+    assert redact_pii("MRN001001 admitted") == "***1001 admitted"
+
+
+def test_mrn_masks_whole_digit_run():
+    assert redact_pii("MRN0012345") == "***2345"
+
+
+def test_zip():
+    assert redact_pii("lives in 10001") == "lives in 100**"
+
+
+def test_mixed_text_detected_in_order():
+    text = "MRN001001 ssn 123-45-6789 zip 02101"
+    assert _kinds(text) == ["MRN", "SSN", "ZIP"]
+    assert redact_pii(text) == "***1001 ssn ***-**-6789 zip 021**"
+
+
+def test_spans_are_positions_in_text():
+    text = "id 123-45-6789"
+    [(pattern_id, (start, end))] = detect_pii(text)
+    assert PII_PATTERNS[pattern_id][0] == "SSN"
+    assert text[start:end] == "123-45-6789"
+
+
+def test_overlong_ssn_tail_is_masked_whole():
+    # ZIP also matches the trailing 5 digits; the earlier SSN span wins
+    assert _kinds("123-45-67890 end") == ["SSN", "ZIP"]
+    assert redact_pii("123-45-67890 end") == "***-**-7890 end"
+
+
+def test_overlong_digit_run_is_masked():
+    assert redact_pii("id 1234567890") == "id ***-**-7890"
+
+
+def test_overlong_premasked_ssn_is_masked_whole():
+    assert redact_pii("XXX-XX-12345") == "***-**-2345"
+
+
+def test_nested_compact_run_inside_ssn_masks_once():
+    assert _kinds("x 123-45-678901234") == ["SSN", "SSN"]
+    assert redact_pii("x 123-45-678901234") == "x ***-**-1234"
+
+
+def test_no_pii():
+    assert detect_pii("routine checkup") == []
+    assert redact_pii("routine checkup") == "routine checkup"
+
+
+def test_none_and_empty():
+    assert detect_pii(None) == []
+    assert detect_pii("") == []
+    assert redact_pii(None) is None
+    assert redact_pii("") == ""
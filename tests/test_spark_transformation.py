@@ -0,0 +1,66 @@
+import os
+import shutil
+
+import pytest
+
+pytest.importorskip("pyspark")
+if not (os.environ.get("JAVA_HOME") or shutil.which("java")):
+    pytest.skip("Spark needs a Java runtime", allow_module_level=True)
+
+from spark_transformation import HealthcareDataTransformer
+
+
+@pytest.fixture(scope="module")
+def transformer():
+    transformer = HealthcareDataTransformer()
+    yield transformer
+    transformer.spark.stop()
+
+
+def test_mask_pii_redacts_free_text_column(transformer):
+    df = transformer.spark.createDataFrame(
+        [("1001", "Smith", "John", "10001", "MRN001001", "SSN 123-45-6789, MRN001001, ZIP 10001"),
+         ("1002", "Doe", "Jane", "10002", "MRN001002", None)],
+        "id string, family string, given_first string, postalCode string, mrn string, narrative string"
+    )
+
+    rows = {row["id"]: row for row in transformer.mask_pii(df).collect()}
+
+    assert rows["1001"]["narrative"] == "SSN ***-**-6789, ***1001, ZIP 100**"
+    assert rows["1002"]["narrative"] is None
+    assert rows["1001"]["mrn_masked"] == "1001"
+    assert rows["1001"]["name_initial"] == "J. Smith"
+    assert rows["1001"]["zip_region"] == "100"
+    assert not {"family", "given_first", "postalCode", "mrn"} & set(rows["1001"].asDict())
+
+
+def test_transform_to_silver_redacts_narrative(transformer):
+    silver = transformer.transform_to_silver(transformer.load_bronze_data())
+
+    narratives = [row["narrative"] for row in silver.orderBy("patient_id").collect()]
+
+    assert narratives == [
+        "<div>***1001, SSN ***-**-6789, home ZIP 100**</div>",
+        "<div>***1002, home ZIP 100**, PCP Dr. Emily Brown</div>",
+    ]
+    transformer.save_to_silver(silver)
+
+
+def _cached_rdd_count(spark):
+    return len(spark.sparkContext._jsc.sc().getRDDStorageInfo())
+
+
+def test_bronze_is_cached_once_and_released(transformer):
+    silver = transformer.transform_to_silver(transformer.load_bronze_data())
+    bronze_cache = transformer._bronze_cache
+
+    # The quality aggregate already materialized the cache; Silver reads from it
+    assert bronze_cache.is_cached
+    assert _cached_rdd_count(transformer.spark) == 1
+    assert "InMemoryRelation" in silver._jdf.queryExecution().optimizedPlan().toString()
+
+    transformer.save_to_silver(silver)
+
+    assert transformer._bronze_cache is None
+    assert not bronze_cache.is_cached
+    assert _cached_rdd_count(transformer.spark) == 0